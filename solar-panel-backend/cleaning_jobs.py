@@ -0,0 +1,215 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Worker pool configuration
+CLEANING_WORKERS = int(os.getenv("CLEANING_WORKERS", "4"))  # Sectors processed in parallel
+ZONE_CONCURRENCY = int(os.getenv("ZONE_CONCURRENCY", "3"))  # Panels cleaned at once per zone
+PANEL_CLEAN_SECONDS = float(os.getenv("PANEL_CLEAN_SECONDS", "0.5"))  # Simulated hardware time per panel
+MAX_JOB_HISTORY = 1000  # Finished jobs kept for polling
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+CANCELLING = "cancelling"  # Waiting for panels already being cleaned to finish
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+
+
+class CleaningJob:
+    def __init__(self, sector_panels: Dict[str, List[str]]):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.sector_panels = sector_panels  # sector_id -> panel ids to clean
+        self.status = QUEUED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.panels_total = sum(len(p) for p in sector_panels.values())
+        self.panels_cleaned = 0
+        self.panels_skipped = 0  # Already clean by the time a worker reached them
+        self.total_water = 0.0
+        self.sectors_remaining = len(sector_panels)
+        self.sectors_in_flight = 0
+        self.error: Optional[str] = None
+        self.cancel_requested = False
+        self.subscribers: List[asyncio.Queue] = []
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "sector_ids": list(self.sector_panels.keys()),
+            "panels_total": self.panels_total,
+            "panels_cleaned": self.panels_cleaned,
+            "panels_skipped": self.panels_skipped,
+            "progress": round(self.panels_done / self.panels_total * 100, 2) if self.panels_total else 100.0,
+            "total_water_used": round(self.total_water, 2),
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error
+        }
+
+    @property
+    def panels_done(self) -> int:
+        return self.panels_cleaned + self.panels_skipped
+
+    @property
+    def stopped(self) -> bool:
+        # No further panels should be cleaned for this job
+        return self.cancel_requested or self.status in FINISHED_STATES
+
+
+class CleaningJobManager:
+    """Queue of bulk cleaning jobs processed by a bounded pool of workers"""
+
+    def __init__(self, clean_panel: Callable[[str], Optional[float]], workers: int = CLEANING_WORKERS,
+                 zone_concurrency: int = ZONE_CONCURRENCY, panel_seconds: float = PANEL_CLEAN_SECONDS):
+        # clean_panel cleans one panel and returns the water used, or None if it was already clean
+        self.clean_panel = clean_panel
+        self.workers = workers
+        self.zone_concurrency = zone_concurrency
+        self.panel_seconds = panel_seconds
+        self.jobs: Dict[str, CleaningJob] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.zone_limits: Dict[str, asyncio.Semaphore] = {}
+        self.worker_tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker pool (call from the app startup hook)"""
+        self.queue = asyncio.Queue()
+        self.worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the worker pool"""
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        self.worker_tasks = []
+
+    def submit(self, sector_panels: Dict[str, List[str]]) -> CleaningJob:
+        """Enqueue a job; each sector becomes a separate unit of work"""
+        job = CleaningJob(sector_panels)
+        self._prune()
+        self.jobs[job.job_id] = job
+        if not sector_panels:
+            self._finish(job, COMPLETED)
+            return job
+        for sector_id in sector_panels:
+            self.queue.put_nowait((job.job_id, sector_id))
+        return job
+
+    def get(self, job_id: str) -> Optional[CleaningJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[CleaningJob]:
+        """Cancel a job; panels already being cleaned are allowed to finish"""
+        job = self.jobs.get(job_id)
+        if job and job.status not in FINISHED_STATES:
+            job.cancel_requested = True
+            if job.sectors_in_flight == 0:
+                self._finish(job, CANCELLED)
+            elif job.status != CANCELLING:
+                job.status = CANCELLING
+                self._publish(job)
+        return job
+
+    def subscribe(self, job: CleaningJob) -> asyncio.Queue:
+        """Get a queue receiving a progress event every time the job changes"""
+        events: asyncio.Queue = asyncio.Queue()
+        events.put_nowait(job.to_dict())
+        if job.status not in FINISHED_STATES:
+            job.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, job: CleaningJob, events: asyncio.Queue):
+        if events in job.subscribers:
+            job.subscribers.remove(events)
+
+    def _prune(self):
+        # Drop the oldest finished jobs once the history is full
+        if len(self.jobs) < MAX_JOB_HISTORY:
+            return
+        for job_id in [j.job_id for j in self.jobs.values() if j.status in FINISHED_STATES][:len(self.jobs) - MAX_JOB_HISTORY + 1]:
+            del self.jobs[job_id]
+
+    def _publish(self, job: CleaningJob):
+        event = job.to_dict()
+        for events in job.subscribers:
+            events.put_nowait(event)
+        if job.status in FINISHED_STATES:
+            job.subscribers = []
+
+    def _finish(self, job: CleaningJob, status: str):
+        job.status = status
+        job.finished_at = datetime.now()
+        self._publish(job)
+
+    def _zone_limit(self, sector_id: str) -> asyncio.Semaphore:
+        if sector_id not in self.zone_limits:
+            self.zone_limits[sector_id] = asyncio.Semaphore(self.zone_concurrency)
+        return self.zone_limits[sector_id]
+
+    async def _clean_one(self, job: CleaningJob, sector_id: str, panel_id: str):
+        # The zone limit is shared between jobs so overlapping requests can't overload a sector
+        async with self._zone_limit(sector_id):
+            if job.stopped:
+                return
+            await asyncio.sleep(self.panel_seconds)
+            water = self.clean_panel(panel_id)
+            if water is None:
+                job.panels_skipped += 1
+            else:
+                job.total_water += water
+                job.panels_cleaned += 1
+            self._publish(job)
+
+    async def _clean_sector(self, job: CleaningJob, sector_id: str):
+        tasks = [
+            asyncio.create_task(self._clean_one(job, sector_id, panel_id))
+            for panel_id in job.sector_panels[sector_id]
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            # Don't keep cleaning the rest of the sector once a panel has failed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _worker(self):
+        while True:
+            job_id, sector_id = await self.queue.get()
+            job = self.jobs.get(job_id)
+            # Cancelled, failed (and possibly pruned) jobs still have their sectors in the queue
+            if job is None or job.stopped:
+                self.queue.task_done()
+                continue
+
+            if job.status == QUEUED:
+                job.status = RUNNING
+                job.started_at = datetime.now()
+                self._publish(job)
+
+            job.sectors_in_flight += 1
+            try:
+                await self._clean_sector(job, sector_id)
+            except Exception as e:
+                print(f"Cleaning job {job_id} error: {e}")
+                if job.status not in FINISHED_STATES:
+                    job.error = str(e)
+                    self._finish(job, FAILED)
+            finally:
+                job.sectors_in_flight -= 1
+                job.sectors_remaining -= 1
+                if job.status not in FINISHED_STATES:
+                    if job.cancel_requested and job.sectors_in_flight == 0:
+                        self._finish(job, CANCELLED)
+                    elif job.sectors_remaining == 0:
+                        self._finish(job, COMPLETED)
+                self.queue.task_done()
@@ -1,8 +1,12 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
 import os
 from dotenv import load_dotenv
 from datetime import datetime
 from typing import Optional, List, Dict
+from metrics import timed_db_operation
 
 # Load environment variables
 load_dotenv()
@@ -10,9 +14,11 @@ load_dotenv()
 # MongoDB connection
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017/")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "solar_panel_ai")
+MONGODB_TIMEOUT_MS = int(os.getenv("MONGODB_TIMEOUT_MS", "2000"))  # Fail fast when MongoDB is down
+ALERT_RETENTION_DAYS = int(os.getenv("ALERT_RETENTION_DAYS", "30"))  # Resolved alerts expire after this
 
 # Async MongoDB client for FastAPI
-motor_client = AsyncIOMotorClient(MONGODB_URL)
+motor_client = AsyncIOMotorClient(MONGODB_URL, serverSelectionTimeoutMS=MONGODB_TIMEOUT_MS)
 database = motor_client[DATABASE_NAME]
 
 # Collections
@@ -27,12 +33,51 @@ class DatabaseManager:
     def __init__(self):
         self.db = database
         
+    @timed_db_operation
+    async def create_indexes(self):
+        """Create indexes; each one is created independently so one failure doesn't skip the rest"""
+        # Alert feed indexes only cover unresolved alerts, which keeps them small as history grows.
+        # Every key ends with (timestamp, _id) so keyset pagination is an index range scan.
+        unresolved = {"partialFilterExpression": {"resolved": False}}
+        indexes = [
+            (alerts_collection, [("timestamp", -1), ("_id", -1)], unresolved),
+            (alerts_collection, [("severity", 1), ("timestamp", -1), ("_id", -1)], unresolved),
+            (alerts_collection, [("sector_id", 1), ("timestamp", -1), ("_id", -1)], unresolved),
+            (alerts_collection, [("panel_id", 1), ("timestamp", -1), ("_id", -1)], unresolved),
+            (panels_collection, "panel_id", {"unique": True}),
+            (sensor_data_collection, [("panel_id", 1), ("timestamp", -1)], {}),
+            (cleaning_history_collection, [("panel_id", 1), ("timestamp", -1)], {}),
+            # Fails if earlier upserts left duplicate (panel_id, date) rows; those need cleaning up by hand
+            (analytics_collection, [("panel_id", 1), ("date", 1)], {"unique": True}),
+        ]
+        for collection, keys, options in indexes:
+            try:
+                await collection.create_index(keys, **options)
+            except PyMongoError as e:
+                print(f"Index {keys} on {collection.name} not created: {e}")
+        
+        try:
+            await self._ensure_alert_ttl_index()
+        except PyMongoError as e:
+            print(f"Alert TTL index not created: {e}")
+    
+    async def _ensure_alert_ttl_index(self):
+        # TTL only applies to documents that have resolved_at, so open alerts never expire
+        expire_after = ALERT_RETENTION_DAYS * 86400
+        existing = (await alerts_collection.index_information()).get("resolved_at_1")
+        if existing is None:
+            await alerts_collection.create_index("resolved_at", expireAfterSeconds=expire_after)
+        elif existing.get("expireAfterSeconds") != expire_after:
+            # create_index can't change TTL options of an existing index
+            await self.db.command("collMod", alerts_collection.name, index={
+                "keyPattern": {"resolved_at": 1},
+                "expireAfterSeconds": expire_after
+            })
+    
+    @timed_db_operation
     async def initialize_database(self):
         """Create indexes and initial data"""
-        # Create indexes for better performance
-        await panels_collection.create_index("panel_id", unique=True)
-        await sensor_data_collection.create_index([("panel_id", 1), ("timestamp", -1)])
-        await cleaning_history_collection.create_index([("panel_id", 1), ("timestamp", -1)])
+        await self.create_indexes()
         
         # Insert sample panels if none exist
         panel_count = await panels_collection.count_documents({})
@@ -67,6 +112,7 @@ class DatabaseManager:
             print("✅ Sample panels inserted")
     
     # Panel operations
+    @timed_db_operation
     async def get_all_panels(self) -> List[Dict]:
         """Get all panels with their latest status"""
         panels = []
@@ -92,6 +138,7 @@ class DatabaseManager:
             panels.append(panel)
         return panels
     
+    @timed_db_operation
     async def get_panel_by_id(self, panel_id: str) -> Optional[Dict]:
         """Get specific panel details"""
         panel = await panels_collection.find_one({"panel_id": panel_id})
@@ -100,12 +147,14 @@ class DatabaseManager:
         return panel
     
     # Sensor data operations
+    @timed_db_operation
     async def save_sensor_data(self, data: Dict) -> str:
         """Save sensor reading"""
         data["timestamp"] = datetime.now()
         result = await sensor_data_collection.insert_one(data)
         return str(result.inserted_id)
     
+    @timed_db_operation
     async def get_sensor_history(self, panel_id: str, hours: int = 24) -> List[Dict]:
         """Get sensor data history for a panel"""
         from datetime import timedelta
@@ -125,6 +174,7 @@ class DatabaseManager:
         return history
     
     # Cleaning operations
+    @timed_db_operation
     async def record_cleaning(self, panel_id: str, water_used: float, duration: int) -> str:
         """Record a cleaning event"""
         cleaning_record = {
@@ -139,6 +189,7 @@ class DatabaseManager:
         result = await cleaning_history_collection.insert_one(cleaning_record)
         return str(result.inserted_id)
     
+    @timed_db_operation
     async def get_cleaning_history(self, panel_id: str) -> List[Dict]:
         """Get cleaning history for a panel"""
         cursor = cleaning_history_collection.find(
@@ -152,6 +203,7 @@ class DatabaseManager:
         return history
     
     # Analytics operations
+    @timed_db_operation
     async def save_daily_analytics(self, panel_id: str, analytics_data: Dict):
         """Save daily analytics summary"""
         analytics_data.update({
@@ -167,6 +219,7 @@ class DatabaseManager:
             upsert=True
         )
     
+    @timed_db_operation
     async def get_panel_analytics(self, panel_id: str, days: int = 7) -> List[Dict]:
         """Get analytics for a panel"""
         from datetime import timedelta
@@ -186,10 +239,13 @@ class DatabaseManager:
         return analytics
     
     # Alert operations
-    async def create_alert(self, panel_id: str, alert_type: str, message: str, severity: str = "medium"):
+    @timed_db_operation
+    async def create_alert(self, panel_id: str, alert_type: str, message: str, severity: str = "medium",
+                           *, sector_id: str):
         """Create an alert"""
         alert = {
             "panel_id": panel_id,
+            "sector_id": sector_id,
             "type": alert_type,  # "dust_high", "efficiency_low", "anomaly"
             "message": message,
             "severity": severity,  # "low", "medium", "high"
@@ -198,17 +254,57 @@ class DatabaseManager:
         }
         await alerts_collection.insert_one(alert)
     
-    async def get_active_alerts(self) -> List[Dict]:
-        """Get all unresolved alerts"""
-        cursor = alerts_collection.find(
-            {"resolved": False}
-        ).sort("timestamp", -1)
+    @timed_db_operation
+    async def get_active_alerts(self, limit: int = 50, cursor: Optional[str] = None,
+                                severity: Optional[str] = None, sector_id: Optional[str] = None,
+                                panel_id: Optional[str] = None) -> Dict:
+        """Get a page of unresolved alerts, newest first
+        
+        Pass the returned next_cursor back in to get the following page.
+        Raises ValueError for a malformed cursor.
+        """
+        query = {"resolved": False}
+        if severity:
+            query["severity"] = severity
+        if sector_id:
+            query["sector_id"] = sector_id
+        if panel_id:
+            query["panel_id"] = panel_id
+        if cursor:
+            last_timestamp, last_id = decode_alert_cursor(cursor)
+            # The top-level bound keeps the index scan a range even if the planner doesn't split the $or
+            query["timestamp"] = {"$lte": last_timestamp}
+            query["$or"] = [
+                {"timestamp": {"$lt": last_timestamp}},
+                {"timestamp": last_timestamp, "_id": {"$lt": last_id}}
+            ]
+        
+        docs = alerts_collection.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1)
         
         alerts = []
-        async for doc in cursor:
-            doc["_id"] = str(doc["_id"])
+        async for doc in docs:
             alerts.append(doc)
-        return alerts
+        
+        has_more = len(alerts) > limit
+        alerts = alerts[:limit]
+        next_cursor = encode_alert_cursor(alerts[-1]) if has_more else None
+        return {
+            "alerts": [serialize_doc(doc) for doc in alerts],
+            "next_cursor": next_cursor
+        }
+    
+    @timed_db_operation
+    async def resolve_alert(self, alert_id: str) -> bool:
+        """Mark an alert resolved; it is removed by the TTL index after ALERT_RETENTION_DAYS"""
+        try:
+            object_id = ObjectId(alert_id)
+        except InvalidId:
+            return False
+        result = await alerts_collection.update_one(
+            {"_id": object_id, "resolved": False},
+            {"$set": {"resolved": True, "resolved_at": datetime.now()}}
+        )
+        return result.modified_count == 1
 
 # Create global database manager instance
 db_manager = DatabaseManager()
@@ -218,4 +314,15 @@ def serialize_doc(doc: Dict) -> Dict:
     """Convert MongoDB document for JSON serialization"""
     if doc and "_id" in doc:
         doc["_id"] = str(doc["_id"])
-    return doc
\ No newline at end of file
+    return doc
+
+# Keyset pagination cursor for the alert feed: "<timestamp>_<object id>"
+def encode_alert_cursor(doc: Dict) -> str:
+    return f"{doc['timestamp'].isoformat()}_{doc['_id']}"
+
+def decode_alert_cursor(cursor: str):
+    try:
+        timestamp, object_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, InvalidId):
+        raise ValueError(f"Invalid alert cursor: {cursor}") from None
\ No newline at end of file
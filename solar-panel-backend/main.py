@@ -1,5 +1,10 @@
-from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi import FastAPI, HTTPException, WebSocket, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pymongo.errors import PyMongoError
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
@@ -7,6 +12,10 @@ import uvicorn
 import asyncio
 import random
 import math
+import time
+from cleaning_jobs import CleaningJobManager, FINISHED_STATES
+import metrics
+from database import db_manager
 
 # Create FastAPI app
 app = FastAPI(title="Solar Panel AI System", version="1.0.0")
@@ -20,6 +29,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency (labelled by route template so panel IDs don't explode cardinality)
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_LATENCY.labels(
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status)
+        ).observe(time.perf_counter() - start)
+
+# Count malformed sensor payloads as ingest rejects before the default 422 response
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    if request.url.path == "/api/sensor-data":
+        metrics.SENSOR_READINGS.labels(result="invalid").inc()
+    return await request_validation_exception_handler(request, exc)
+
 # Constants for large-scale simulation
 TOTAL_PANELS = 2700
 AREA_SIZE_KM = 10  # 10km x 10km
@@ -114,6 +147,63 @@ sensor_history = []
 cleaning_history = []
 alerts = []
 
+# Apply a cleaning to a single panel and record it, returns water used in liters
+def apply_cleaning(panel_id: str, cleaning_type: str = "manual") -> float:
+    panel = panels_db[panel_id]
+    panel["dust_level"] = random.uniform(50, 150)
+    panel["current_efficiency"] = random.uniform(92, 98)
+    panel["voltage"] = 19.5 * (panel["current_efficiency"] / 100)
+    panel["last_cleaned"] = datetime.now()
+    panel["needs_cleaning"] = False
+    
+    cleaning_history.append({
+        "panel_id": panel_id,
+        "sector_id": panel["sector_id"],
+        "timestamp": datetime.now().isoformat(),
+        "water_used": 2.3,
+        "duration": 120,
+        "type": cleaning_type
+    })
+    return 2.3
+
+def needs_cleaning(panel: Dict) -> bool:
+    return panel["dust_level"] > 300 or panel["current_efficiency"] < 85
+
+# Clean a panel from a bulk job, skipping it if another job already cleaned it
+def apply_bulk_cleaning(panel_id: str) -> Optional[float]:
+    if not needs_cleaning(panels_db[panel_id]):
+        return None
+    return apply_cleaning(panel_id, "bulk")
+
+# Background cleaning jobs (bulk sector / farm-wide cleans)
+cleaning_jobs = CleaningJobManager(apply_bulk_cleaning)
+
+@app.on_event("startup")
+async def start_cleaning_workers():
+    await cleaning_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_cleaning_workers():
+    await cleaning_jobs.stop()
+
+# Create MongoDB indexes in the background so startup doesn't wait on the database
+@app.on_event("startup")
+async def create_database_indexes():
+    async def create():
+        try:
+            await db_manager.create_indexes()
+        except Exception as e:
+            print(f"Database index creation error: {e}")
+    app.state.db_index_task = asyncio.create_task(create())
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    app.state.loop_lag_task = asyncio.create_task(metrics.monitor_event_loop_lag())
+
+@app.on_event("shutdown")
+async def stop_loop_lag_monitor():
+    app.state.loop_lag_task.cancel()
+
 # Pydantic models
 class SensorData(BaseModel):
     panel_id: str
@@ -128,6 +218,9 @@ class SensorData(BaseModel):
             data['timestamp'] = datetime.now()
         super().__init__(**data)
 
+class CleaningJobRequest(BaseModel):
+    sector_ids: Optional[List[str]] = None  # None or empty cleans the whole farm
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -143,6 +236,21 @@ async def root():
         }
     }
 
+# Prometheus metrics
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Sample all threads for a time window and return folded stacks for a flame graph
+@app.get("/debug/profile")
+async def get_profile(seconds: float = 10):
+    if not metrics.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling disabled (set PROFILING_ENABLED=true)")
+    seconds = min(max(seconds, 0.1), metrics.PROFILE_MAX_SECONDS)
+    # Sample from a worker thread so the event loop thread shows up in the stacks
+    folded = await asyncio.to_thread(metrics.sample_stacks, seconds)
+    return PlainTextResponse(folded)
+
 # Get all sectors summary
 @app.get("/api/sectors")
 async def get_sectors():
@@ -230,29 +338,90 @@ async def get_statistics():
         "estimated_daily_revenue": round(total_power_output * 24 * 0.05, 2)  # Assuming $0.05/kWh
     }
 
-# Clean individual panel
+# Queue a cleaning job for the dirty panels of the given sectors
+def enqueue_cleaning(sector_ids: List[str]):
+    sector_panels = {sector_id: [] for sector_id in sector_ids}
+    for panel in panels_db.values():
+        if panel["sector_id"] in sector_panels and needs_cleaning(panel):
+            sector_panels[panel["sector_id"]].append(panel["panel_id"])
+    # Skip sectors with nothing to clean so they don't take a worker slot
+    return cleaning_jobs.submit({s: p for s, p in sector_panels.items() if p})
+
+# Bulk clean sector (runs in the background, poll /api/clean/jobs/{job_id} for progress)
+@app.post("/api/sectors/{sector_id}/clean", status_code=202)
+async def clean_sector(sector_id: str):
+    if sector_id not in sectors_db:
+        raise HTTPException(status_code=404, detail="Sector not found")
+    
+    job = enqueue_cleaning([sector_id])
+    return {
+        "sector_id": sector_id,
+        "job_id": job.job_id,
+        "panels_queued": job.panels_total,
+        "estimated_water_usage": round(job.panels_total * 2.3, 2),
+        "status": job.status
+    }
+
+# Multi-sector or farm-wide clean
+@app.post("/api/clean/jobs", status_code=202)
+async def create_cleaning_job(request: CleaningJobRequest):
+    sector_ids = request.sector_ids or list(sectors_db.keys())
+    unknown = [s for s in sector_ids if s not in sectors_db]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Sectors not found: {', '.join(unknown)}")
+    
+    job = enqueue_cleaning(list(dict.fromkeys(sector_ids)))
+    return job.to_dict()
+
+@app.get("/api/clean/jobs")
+async def get_cleaning_jobs(limit: int = 50):
+    jobs = sorted(cleaning_jobs.jobs.values(), key=lambda j: j.created_at, reverse=True)
+    return [job.to_dict() for job in jobs[:min(max(limit, 1), 200)]]
+
+@app.get("/api/clean/jobs/{job_id}")
+async def get_cleaning_job(job_id: str):
+    job = cleaning_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/api/clean/jobs/{job_id}/cancel")
+async def cancel_cleaning_job(job_id: str):
+    job = cleaning_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+# WebSocket progress events for a cleaning job, closes once the job finishes
+@app.websocket("/ws/clean/jobs/{job_id}")
+async def cleaning_job_progress(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    job = cleaning_jobs.get(job_id)
+    if not job:
+        await websocket.send_json({"job_id": job_id, "error": "Job not found"})
+        await websocket.close()
+        return
+    
+    events = cleaning_jobs.subscribe(job)
+    try:
+        while True:
+            event = await events.get()
+            await websocket.send_json(event)
+            if event["status"] in FINISHED_STATES:
+                break
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        cleaning_jobs.unsubscribe(job, events)
+        await websocket.close()
+
+# Clean individual panel (declared after /api/clean/jobs so "jobs" isn't taken as a panel ID)
 @app.post("/api/clean/{panel_id}")
 async def clean_panel(panel_id: str):
     if panel_id not in panels_db:
         raise HTTPException(status_code=404, detail="Panel not found")
     
-    # Clean the panel
-    panels_db[panel_id]["dust_level"] = random.uniform(50, 150)
-    panels_db[panel_id]["current_efficiency"] = random.uniform(92, 98)
-    panels_db[panel_id]["voltage"] = 19.5 * (panels_db[panel_id]["current_efficiency"] / 100)
-    panels_db[panel_id]["last_cleaned"] = datetime.now()
-    panels_db[panel_id]["needs_cleaning"] = False
-    
-    # Record cleaning
-    cleaning_record = {
-        "panel_id": panel_id,
-        "sector_id": panels_db[panel_id]["sector_id"],
-        "timestamp": datetime.now().isoformat(),
-        "water_used": 2.3,
-        "duration": 120,
-        "type": "manual"
-    }
-    cleaning_history.append(cleaning_record)
+    apply_cleaning(panel_id)
     
     return {
         "message": f"Cleaning initiated for panel {panel_id}",
@@ -264,43 +433,6 @@ async def clean_panel(panel_id: str):
         "new_dust_level": panels_db[panel_id]["dust_level"]
     }
 
-# Bulk clean sector
-@app.post("/api/sectors/{sector_id}/clean")
-async def clean_sector(sector_id: str):
-    sector_panels = [p for p in panels_db.values() if p["sector_id"] == sector_id]
-    if not sector_panels:
-        raise HTTPException(status_code=404, detail="Sector not found")
-    
-    cleaned_count = 0
-    total_water = 0
-    
-    for panel in sector_panels:
-        if panel["dust_level"] > 300 or panel["current_efficiency"] < 85:
-            # Clean the panel
-            panels_db[panel["panel_id"]]["dust_level"] = random.uniform(50, 150)
-            panels_db[panel["panel_id"]]["current_efficiency"] = random.uniform(92, 98)
-            panels_db[panel["panel_id"]]["voltage"] = 19.5 * (panels_db[panel["panel_id"]]["current_efficiency"] / 100)
-            panels_db[panel["panel_id"]]["last_cleaned"] = datetime.now()
-            
-            cleaned_count += 1
-            total_water += 2.3  # Liters per panel
-            
-            # Record cleaning
-            cleaning_history.append({
-                "panel_id": panel["panel_id"],
-                "sector_id": sector_id,
-                "timestamp": datetime.now().isoformat(),
-                "water_used": 2.3
-            })
-    
-    return {
-        "sector_id": sector_id,
-        "panels_cleaned": cleaned_count,
-        "total_water_used": round(total_water, 2),
-        "estimated_efficiency_gain": round(cleaned_count * 10 / len(sector_panels), 2),  # Percentage points
-        "status": "completed"
-    }
-
 # AI prediction for sector
 @app.post("/api/predict/sector/{sector_id}")
 async def predict_sector_cleaning(sector_id: str):
@@ -343,8 +475,10 @@ async def predict_sector_cleaning(sector_id: str):
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    metrics.WS_CLIENTS.inc()
     try:
         while True:
+            tick_start = time.perf_counter()
             # Simulate real-time updates for a subset of panels
             sample_size = 50  # Monitor 50 random panels in real-time
             sample_panels = random.sample(list(panels_db.values()), sample_size)
@@ -408,25 +542,56 @@ async def websocket_endpoint(websocket: WebSocket):
             }
             
             await websocket.send_json(data)
+            metrics.WS_TICK_DURATION.observe(time.perf_counter() - tick_start)
             await asyncio.sleep(3)  # Update every 3 seconds
             
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
+        metrics.WS_CLIENTS.dec()
         await websocket.close()
 
+# Alerts are written in the background so a slow or missing MongoDB doesn't hold up ingest
+alert_tasks = set()
+
+def raise_cleaning_alert(panel: Dict):
+    if panel["dust_level"] > 300:
+        alert_type = "dust_high"
+        message = f"Panel {panel['panel_id']} dust level {panel['dust_level']:.0f} needs cleaning"
+    else:
+        alert_type = "efficiency_low"
+        message = f"Panel {panel['panel_id']} efficiency dropped to {panel['current_efficiency']:.1f}%"
+    severity = "high" if panel["current_efficiency"] < 80 else "medium"
+    
+    async def create():
+        try:
+            await db_manager.create_alert(panel["panel_id"], alert_type, message, severity,
+                                          sector_id=panel["sector_id"])
+        except Exception as e:
+            print(f"Alert creation error: {e}")
+    
+    task = asyncio.create_task(create())
+    alert_tasks.add(task)
+    task.add_done_callback(alert_tasks.discard)
+
 # Submit sensor data (for IoT integration)
 @app.post("/api/sensor-data")
 async def submit_sensor_data(data: SensorData):
     if data.panel_id not in panels_db:
+        metrics.SENSOR_READINGS.labels(result="unknown_panel").inc()
         raise HTTPException(status_code=404, detail="Panel not found")
     
     # Update panel state
+    was_dirty = needs_cleaning(panels_db[data.panel_id])
     efficiency = calculate_efficiency(data.voltage, data.current)
     panels_db[data.panel_id]["voltage"] = data.voltage
     panels_db[data.panel_id]["current_efficiency"] = efficiency
     panels_db[data.panel_id]["dust_level"] = data.dust_level
     
+    # Raise an alert when the panel first crosses the cleaning threshold
+    if not was_dirty and needs_cleaning(panels_db[data.panel_id]):
+        raise_cleaning_alert(panels_db[data.panel_id])
+    
     # Store sensor reading
     sensor_reading = {
         "panel_id": data.panel_id,
@@ -443,6 +608,7 @@ async def submit_sensor_data(data: SensorData):
     # Keep only last 10000 readings
     if len(sensor_history) > 10000:
         sensor_history.pop(0)
+    metrics.SENSOR_READINGS.labels(result="accepted").inc()
     
     return {
         "message": "Data received",
@@ -452,6 +618,32 @@ async def submit_sensor_data(data: SensorData):
         "needs_cleaning": data.dust_level > 300 or efficiency < 85
     }
 
+# Get active alerts (keyset paginated, pass next_cursor back as cursor for the next page)
+@app.get("/api/alerts")
+async def get_alerts(limit: int = 50, cursor: Optional[str] = None, severity: Optional[str] = None,
+                     sector_id: Optional[str] = None, panel_id: Optional[str] = None):
+    try:
+        page = await db_manager.get_active_alerts(
+            limit=min(max(limit, 1), 200), cursor=cursor,
+            severity=severity, sector_id=sector_id, panel_id=panel_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PyMongoError:
+        raise HTTPException(status_code=503, detail="Alert database unavailable")
+    return page
+
+# Resolve an alert
+@app.put("/api/alerts/{alert_id}/resolve")
+async def resolve_alert(alert_id: str):
+    try:
+        resolved = await db_manager.resolve_alert(alert_id)
+    except PyMongoError:
+        raise HTTPException(status_code=503, detail="Alert database unavailable")
+    if not resolved:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"_id": alert_id, "resolved": True}
+
 # Get alerts summary
 @app.get("/api/alerts/summary")
 async def get_alerts_summary():
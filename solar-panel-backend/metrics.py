@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from functools import wraps
+from prometheus_client import Counter, Gauge, Histogram
+
+# Opt-in sampling profiler (adds a small per-sample cost while a window is running)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_MAX_SECONDS = 60
+LOOP_LAG_INTERVAL = 0.5  # Seconds between event-loop lag probes
+
+# HTTP
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"]
+)
+
+# WebSocket monitoring feed
+WS_TICK_DURATION = Histogram(
+    "ws_tick_duration_seconds", "Time spent building and sending one /ws update",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+WS_CLIENTS = Gauge("ws_connected_clients", "Connected /ws clients")
+
+# Sensor ingest
+SENSOR_READINGS = Counter(
+    "sensor_readings_total", "Sensor readings received by /api/sensor-data",
+    ["result"]  # "accepted", "unknown_panel", "invalid"
+)
+
+# MongoDB
+DB_OPERATION_DURATION = Histogram(
+    "db_operation_duration_seconds", "DatabaseManager operation latency",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+# Event loop
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wake-up and when the loop ran it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+def timed_db_operation(func):
+    """Record the duration of an async DatabaseManager method"""
+    histogram = DB_OPERATION_DURATION.labels(operation=func.__name__)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+async def monitor_event_loop_lag():
+    """Background task: sleep for a fixed interval and record how late we woke up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - start - LOOP_LAG_INTERVAL))
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """Sample every thread's stack for a time window and return folded stacks
+
+    The output is the "collapsed" format used by flamegraph.pl and speedscope:
+    one line per unique stack, frames separated by ';', followed by the sample count.
+    """
+    samples: StackCounter = StackCounter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            samples[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { AlertTriangle, CheckCircle, X, Bell } from 'lucide-react'
 import { getAlerts, resolveAlert } from '@/lib/api'
 import toast from 'react-hot-toast'
@@ -6,11 +6,25 @@ import toast from 'react-hot-toast'
 export default function AlertsPanel() {
   const [alerts, setAlerts] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const loadedMore = useRef(false)
 
   const fetchAlerts = async () => {
     try {
       const data = await getAlerts()
-      setAlerts(data)
+      if (!loadedMore.current) {
+        setAlerts(data.alerts)
+        setNextCursor(data.next_cursor)
+        return
+      }
+      // Extra pages are loaded: refresh the first page and keep the older alerts below it
+      setAlerts(prev => {
+        const fresh = new Set(data.alerts.map((alert: any) => alert._id))
+        const oldest = data.alerts[data.alerts.length - 1]?.timestamp
+        const older = prev.filter(alert => !fresh.has(alert._id) && (!oldest || alert.timestamp <= oldest))
+        return [...data.alerts, ...older]
+      })
     } catch (error) {
       console.error('Failed to fetch alerts:', error)
     } finally {
@@ -18,6 +32,24 @@ export default function AlertsPanel() {
     }
   }
 
+  const loadMoreAlerts = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const data = await getAlerts({ cursor: nextCursor })
+      setAlerts(prev => {
+        const seen = new Set(prev.map(alert => alert._id))
+        return [...prev, ...data.alerts.filter((alert: any) => !seen.has(alert._id))]
+      })
+      setNextCursor(data.next_cursor)
+      loadedMore.current = true
+    } catch (error) {
+      toast.error('Failed to load more alerts')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   useEffect(() => {
     fetchAlerts()
     // Refresh alerts every 30 seconds
@@ -28,7 +60,7 @@ export default function AlertsPanel() {
   const handleResolve = async (alertId: string) => {
     try {
       await resolveAlert(alertId)
-      setAlerts(prev => prev.filter(alert => alert.id !== alertId))
+      setAlerts(prev => prev.filter(alert => alert._id !== alertId))
       toast.success('Alert resolved')
     } catch (error) {
       toast.error('Failed to resolve alert')
@@ -56,7 +88,7 @@ export default function AlertsPanel() {
           Active Alerts
         </h3>
         <span className="text-sm text-gray-500">
-          {alerts.length} active
+          {alerts.length}{nextCursor ? '+' : ''} active
         </span>
       </div>
 
@@ -78,7 +110,7 @@ export default function AlertsPanel() {
         <div className="space-y-3 max-h-64 overflow-y-auto">
           {alerts.map((alert) => (
             <div
-              key={alert.id || alert._id}
+              key={alert._id}
               className={`p-3 rounded-lg border ${
                 alert.severity === 'high' ? 'border-red-300' :
                 alert.severity === 'medium' ? 'border-yellow-300' : 'border-blue-300'
@@ -100,7 +132,7 @@ export default function AlertsPanel() {
                   </p>
                 </div>
                 <button
-                  onClick={() => handleResolve(alert.id || alert._id)}
+                  onClick={() => handleResolve(alert._id)}
                   className="text-gray-400 hover:text-gray-600 transition-colors"
                   title="Resolve alert"
                 >
@@ -109,6 +141,15 @@ export default function AlertsPanel() {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <button
+              onClick={loadMoreAlerts}
+              disabled={loadingMore}
+              className="w-full text-sm text-blue-600 hover:text-blue-800 py-2 disabled:text-gray-400"
+            >
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
       )}
     </div>
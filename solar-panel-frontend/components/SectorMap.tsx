@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react'
-import { AlertTriangle, CheckCircle, Droplets, Zap, TrendingUp, Sparkles } from 'lucide-react'
-import { getSectors, cleanSector, predictSectorCleaning } from '@/lib/api'
+import { useState, useEffect, useRef } from 'react'
+import { AlertTriangle, CheckCircle, Droplets, Zap, TrendingUp, Sparkles, X } from 'lucide-react'
+import { getSectors, cleanSector, createCleaningJob, getCleaningJob, cancelCleaningJob, predictSectorCleaning } from '@/lib/api'
 import toast from 'react-hot-toast'
 
 interface Sector {
@@ -23,11 +23,14 @@ export default function SectorMap({ onSelectSector, selectedSector, wsData }: Se
   const [sectors, setSectors] = useState<Sector[]>([])
   const [loading, setLoading] = useState(true)
   const [cleaningSectors, setCleaningSectors] = useState<Set<string>>(new Set())
+  const [sectorJobs, setSectorJobs] = useState<Record<string, string>>({})  // sector_id -> cleaning job_id
+  const mounted = useRef(true)
   const [hoveredSector, setHoveredSector] = useState<string | null>(null)
   const [aiPrediction, setAiPrediction] = useState<any>(null)
 
   useEffect(() => {
     fetchSectors()
+    return () => { mounted.current = false }
   }, [])
 
   useEffect(() => {
@@ -63,35 +66,90 @@ export default function SectorMap({ onSelectSector, selectedSector, wsData }: Se
     }
   }
 
+  const stopCleaning = (sectorIds: string[]) => {
+    setCleaningSectors(prev => {
+      const next = new Set(prev)
+      sectorIds.forEach(id => next.delete(id))
+      return next
+    })
+    setSectorJobs(prev => {
+      const next = { ...prev }
+      sectorIds.forEach(id => delete next[id])
+      return next
+    })
+  }
+
+  // Poll the background cleaning job until it finishes; null if the component unmounted
+  const waitForCleaningJob = async (jobId: string) => {
+    while (mounted.current) {
+      try {
+        const job = await getCleaningJob(jobId)
+        if (['completed', 'cancelled', 'failed'].includes(job.status)) return job
+      } catch (error: any) {
+        // The job was pruned or the backend restarted; the clean itself was queued fine
+        if (error?.response?.status === 404) return { status: 'unknown' }
+        throw error
+      }
+      await new Promise(resolve => setTimeout(resolve, 2000))
+    }
+    return null
+  }
+
+  const trackCleaningJob = async (jobId: string, sectorIds: string[], label: string) => {
+    setSectorJobs(prev => ({ ...prev, ...Object.fromEntries(sectorIds.map(id => [id, jobId])) }))
+    
+    const job = await waitForCleaningJob(jobId)
+    if (!job) return
+    if (job.status === 'completed') {
+      toast.success(`Cleaned ${job.panels_cleaned} panels in ${label}`)
+      // Refresh sector data now that the panels are actually clean
+      setSectors(await getSectors())
+    } else if (job.status === 'unknown') {
+      toast(`Lost track of cleaning in ${label}`)
+      setSectors(await getSectors())
+    } else {
+      toast.error(`Cleaning ${label} ${job.status}`)
+    }
+  }
+
   const handleCleanSector = async (sectorId: string, e: React.MouseEvent) => {
     e.stopPropagation()
     setCleaningSectors(prev => new Set(prev).add(sectorId))
     
     try {
       const result = await cleanSector(sectorId)
-      toast.success(`Cleaned ${result.panels_cleaned} panels in sector ${sectorId}`)
-      
-      // Update sector data
-      setSectors(prev => prev.map(s => 
-        s.sector_id === sectorId 
-          ? { ...s, average_efficiency: 95, panels_needing_cleaning: 0 }
-          : s
-      ))
-      
-      setTimeout(() => {
-        setCleaningSectors(prev => {
-          const next = new Set(prev)
-          next.delete(sectorId)
-          return next
-        })
-      }, 2000)
+      toast.success(`Queued ${result.panels_queued} panels for cleaning in sector ${sectorId}`)
+      await trackCleaningJob(result.job_id, [sectorId], `sector ${sectorId}`)
     } catch (error) {
       toast.error('Failed to clean sector')
-      setCleaningSectors(prev => {
-        const next = new Set(prev)
-        next.delete(sectorId)
-        return next
-      })
+    } finally {
+      if (mounted.current) stopCleaning([sectorId])
+    }
+  }
+
+  const handleCleanFarm = async () => {
+    const sectorIds = sectors.map(s => s.sector_id)
+    setCleaningSectors(new Set(sectorIds))
+    
+    try {
+      const job = await createCleaningJob()
+      toast.success(`Queued ${job.panels_total} panels for cleaning across the farm`)
+      await trackCleaningJob(job.job_id, sectorIds, 'the farm')
+    } catch (error) {
+      toast.error('Failed to clean farm')
+    } finally {
+      if (mounted.current) stopCleaning(sectorIds)
+    }
+  }
+
+  const handleCancelCleaning = async (sectorId: string) => {
+    const jobId = sectorJobs[sectorId]
+    if (!jobId) return
+    try {
+      await cancelCleaningJob(jobId)
+      toast.success('Cleaning cancelled')
+    } catch (error) {
+      toast.error('Failed to cancel cleaning')
     }
   }
 
@@ -163,8 +221,16 @@ export default function SectorMap({ onSelectSector, selectedSector, wsData }: Se
             <span>Critical (0-75%)</span>
           </div>
         </div>
-        <div className="text-sm text-gray-600">
+        <div className="flex items-center gap-3 text-sm text-gray-600">
           10km × 10km Solar Farm • 2,700 Panels • 81 Sectors
+          <button
+            onClick={handleCleanFarm}
+            disabled={cleaningSectors.size > 0}
+            className="bg-blue-500 hover:bg-blue-600 disabled:bg-gray-300 text-white py-1 px-3 rounded flex items-center gap-1 transition-colors"
+          >
+            <Droplets size={14} />
+            Clean All
+          </button>
         </div>
       </div>
 
@@ -288,7 +354,18 @@ export default function SectorMap({ onSelectSector, selectedSector, wsData }: Se
       {/* Selected Sector Info */}
       {selectedSector && (
         <div className="bg-blue-50 border border-blue-200 rounded-lg p-3 text-sm">
-          <p className="font-medium">Selected: Sector {selectedSector}</p>
+          <div className="flex items-center justify-between">
+            <p className="font-medium">Selected: Sector {selectedSector}</p>
+            {sectorJobs[selectedSector] && (
+              <button
+                onClick={() => handleCancelCleaning(selectedSector)}
+                className="text-red-600 hover:text-red-800 flex items-center gap-1"
+              >
+                <X size={14} />
+                Cancel cleaning
+              </button>
+            )}
+          </div>
           <p className="text-gray-600">Click on panels below to see detailed information</p>
         </div>
       )}
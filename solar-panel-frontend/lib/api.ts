@@ -43,6 +43,22 @@ export const cleanSector = async (sectorId: string) => {
   return response.data
 }
 
+// Cleaning jobs (bulk cleans run in the background)
+export const createCleaningJob = async (sectorIds?: string[]) => {
+  const response = await api.post('/api/clean/jobs', { sector_ids: sectorIds ?? null })
+  return response.data
+}
+
+export const getCleaningJob = async (jobId: string) => {
+  const response = await api.get(`/api/clean/jobs/${jobId}`)
+  return response.data
+}
+
+export const cancelCleaningJob = async (jobId: string) => {
+  const response = await api.post(`/api/clean/jobs/${jobId}/cancel`)
+  return response.data
+}
+
 // Statistics
 export const getStatistics = async () => {
   const response = await api.get('/api/statistics')
@@ -89,8 +105,14 @@ export const predictSectorCleaning = async (sectorId: string) => {
 }
 
 // Alerts
-export const getAlerts = async () => {
-  const response = await api.get('/api/alerts')
+export const getAlerts = async (params: {
+  limit?: number
+  cursor?: string
+  severity?: string
+  sector_id?: string
+  panel_id?: string
+} = {}) => {
+  const response = await api.get('/api/alerts', { params })
   return response.data
 }
 